@@ -1,45 +1,156 @@
-import requests
+import os
+import re
+import logging
+import functools
+import types
+import itertools
 import base64
 import time
-import json
 import zlib
-from Crypto.PublicKey import ECC
-from Crypto.Cipher import AES
-from Crypto.Hash import SHA256
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+import hashlib
+import collections
+import threading
+import concurrent.futures
+
+# orjson이 없으면 표준 json으로 대체 (둘 다 bytes를 주고받도록 통일)
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    import json
+
+    def _dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+
+    _loads = json.loads
+
+# 로그 레벨은 ZENGINEER_LOG 환경변수로 조정 (예: ZENGINEER_LOG=DEBUG)
+# 미설정 시에는 호스트 애플리케이션(ComfyUI)의 로깅 설정을 그대로 따름
+logger = logging.getLogger("z_engineer")
+
+def _env_log_level(value):
+    # 레벨 이름(DEBUG 등) 또는 숫자만 인정하고, 그 외 값은 INFO로 대체 (임포트 시 예외 방지)
+    value = value.strip()
+    if value.isascii() and value.isdigit():
+        return int(value)
+    # getLevelNamesMapping은 3.11+ 전용이므로 이전 버전에서는 내부 매핑 사용
+    names = logging.getLevelNamesMapping() if hasattr(logging, "getLevelNamesMapping") else logging._nameToLevel
+    return names.get(value.upper(), logging.INFO)
+
+if os.environ.get("ZENGINEER_LOG"):
+    logger.setLevel(_env_log_level(os.environ["ZENGINEER_LOG"]))
+
+# api_url 형식 검사용 (스킴 + 호스트, 선택적 경로)
+_URL_RE = re.compile(r'^https?://[^/\s]+(?:/\S*)?$', re.IGNORECASE)
+
+@functools.lru_cache(maxsize=4)
+def _is_valid_url(url):
+    return _URL_RE.match(url) is not None
+
+# ComfyUI는 실행마다 같은 입력 문자열을 넘기므로 정제 결과를 재사용
+@functools.lru_cache(maxsize=8)
+def _normalize_url(url):
+    return url.strip().rstrip("/")
+
+@functools.lru_cache(maxsize=8)
+def _strip_input(value):
+    return value.strip()
+
+# 정제된 api_url/api_key 조합별 엔드포인트와 요청 헤더 (반환된 dict는 수정하지 않음)
+@functools.lru_cache(maxsize=8)
+def _request_target(api_url, api_key):
+    return f"{api_url}/engineer_secure", {"X-API-Key": api_key}
+
+# 기본 시스템 프롬프트 (INPUT_TYPES 호출마다 재생성하지 않도록 모듈 상수로 유지)
+ORIGINAL_SYSTEM_PROMPT = (
+    "You are Z-Engineer, an expert prompt engineering AI specializing in the Z-Image Turbo architecture (S3-DiT). "
+    "Your goal is to rewrite simple user inputs into high-fidelity, \"Positive Constraint\" prompts.\n\n"
+    "CORE RULES:\n"
+    "1. NO Negative Prompts.\n"
+    "2. Use Natural Language Syntax.\n"
+    "3. Aggressively describe textures.\n"
+    "4. Do NOT use double quotes at the start and end of the output.\n"
+    "5. Explicitly state proper anatomy.\n"
+    "6. Always use 'shot on' for camera types.\n\n"
+    "OUTPUT FORMAT: Return ONLY the enhanced prompt string."
+)
+
+# 모든 노드 클래스가 공유하는 HTTP/2 클라이언트 (keep-alive 연결 풀 공유)
+_SHARED_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+def _get_shared_session():
+    global _SHARED_SESSION
+    # HTTP/2 클라이언트: 하나의 TCP+TLS 연결 위에서 요청을 다중화
+    with _SESSION_LOCK:
+        if _SHARED_SESSION is None:
+            import ssl
+            import certifi
+            import httpx
+            # httpx 기본과 동일한 CA 선택 순서(SSL_CERT_FILE -> SSL_CERT_DIR -> certifi)를 따르되,
+            # AES-NI/ChaCha20 기반 AEAD 스위트로 제한 (TLS 1.2 협상 시)
+            if os.environ.get("SSL_CERT_FILE"):
+                ssl_context = ssl.create_default_context(cafile=os.environ["SSL_CERT_FILE"])
+            elif os.environ.get("SSL_CERT_DIR"):
+                ssl_context = ssl.create_default_context(capath=os.environ["SSL_CERT_DIR"])
+            else:
+                ssl_context = ssl.create_default_context(cafile=certifi.where())
+            ssl_context.set_ciphers('ECDHE+AESGCM:ECDHE+CHACHA20')
+            # transport를 직접 넘기지 않아야 HTTP(S)_PROXY/NO_PROXY 환경변수 프록시가 적용됨
+            _SHARED_SESSION = httpx.Client(
+                http2=True,
+                verify=ssl_context,
+                # 동시 실행 분기가 풀 대기에 막히지 않도록 상한 없이 열고, 유휴 연결은 32개까지 유지
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=None),
+                # 고정 헤더는 세션에 한 번만 설정하고, 요청마다 API 키만 전달
+                headers={
+                    "Content-Type": "application/json",
+                    "Accept": "application/json",
+                    "User-Agent": "ComfyUI-Z-Engineer-Client/1.0",
+                },
+            )
+        return _SHARED_SESSION
 
 class QwenSecureE2EEClient:
     """
     [Z-Engineer E2EE 클라이언트 - 세션 동기화 강화 버전]
-    - 최적화: zlib 압축 및 AES-256-GCM 보안 통신
-    - 세션 관리: 서버 공개키 변경 감지 시 모든 클래스 변수 자동 리셋
+    - 최적화: zlib 압축 및 AES-256-GCM 보안 통신 (OpenSSL AES-NI 경로)
+    - 키 교환: 서버 공개키 종류로 X25519(HKDF) 또는 P-256(SHA-256) 자동 선택 (raw/SEC1/DER 입력 지원)
+    - 세션 관리: 서버 공개키별로 핸드셰이크 결과를 캐시하고 만료/오류 시 해당 키만 재협상
     - 안정성: 클래스 직접 참조 방식을 통한 인스턴스 간 데이터 파편화 방지
     """
     
     # 클래스 수준에서 관리되는 세션 상태 변수
-    _shared_key = None
-    _client_pub_b64 = None
-    _last_key_time = 0
+    # server_pub_key -> (client_pub_b64, aesgcm, nonce_prefix, nonce_counter, created_at)
+    _cached_keys = {}
+    # server_pub_key 문자열 -> 파싱된 공개키 객체 (재핸드셰이크 시 디코딩/점 검증 생략)
+    _server_pub_cache = {}
+    _key_lock = threading.Lock()
     _key_lifetime = 3600 
-    _current_server_pub_key = "" 
-    _session = None
+    _crypto = None
+
+    # 페이로드 압축 레벨 (JSON 기준 9와 압축률 차이는 미미하고 CPU 비용은 약 절반)
+    _compress_level = 6
+    # 이보다 작은 페이로드는 압축 없이 stored 블록으로만 감쌈 (서버는 동일하게 zlib 해제)
+    _compress_threshold = 1024
+
+    # HTTP 재시도 정책 (지수 백오프)
+    _max_retries = 3
+    _backoff_factor = 0.3
+    _backoff_max = 5.0
+    _retry_status = (429, 500, 502, 503, 504)
+
+    # 동일 입력 재실행 시 네트워크 왕복을 생략하기 위한 결과 캐시 (LRU)
+    _result_cache = collections.OrderedDict()
+    _result_cache_size = 64
+
+    # 동시에 들어온 동일 요청을 하나의 왕복으로 합치기 위한 진행 중 요청 맵
+    _inflight = {}
+    _inflight_lock = threading.Lock()
 
     @classmethod
     def INPUT_TYPES(s):
-        ORIGINAL_SYSTEM_PROMPT = (
-            "You are Z-Engineer, an expert prompt engineering AI specializing in the Z-Image Turbo architecture (S3-DiT). "
-            "Your goal is to rewrite simple user inputs into high-fidelity, \"Positive Constraint\" prompts.\n\n"
-            "CORE RULES:\n"
-            "1. NO Negative Prompts.\n"
-            "2. Use Natural Language Syntax.\n"
-            "3. Aggressively describe textures.\n"
-            "4. Do NOT use double quotes at the start and end of the output.\n"
-            "5. Explicitly state proper anatomy.\n"
-            "6. Always use 'shot on' for camera types.\n\n"
-            "OUTPUT FORMAT: Return ONLY the enhanced prompt string."
-        )
-
         return {
             "required": {
                 "api_url": ("STRING", {"default": ""}),
@@ -60,106 +171,256 @@ class QwenSecureE2EEClient:
     CATEGORY = "QwenTextEngineer"
 
     @classmethod
-    def _get_session(cls):
-        if cls._session is None:
-            session = requests.Session()
-            adapter = HTTPAdapter(max_retries=Retry(total=3, backoff_factor=0.3), pool_connections=10, pool_maxsize=10)
-            session.mount('https://', adapter)
-            session.mount('http://', adapter)
-            cls._session = session
-        return cls._session
+    def _get_crypto(cls):
+        # 암호화 모듈은 ComfyUI 시작 시가 아닌 첫 핸드셰이크 시점에 로드
+        if cls._crypto is None:
+            from cryptography.exceptions import InvalidTag
+            from cryptography.hazmat.primitives import hashes
+            from cryptography.hazmat.primitives.asymmetric import ec, x25519
+            from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+            from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+            from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat, load_der_public_key
+            cls._crypto = types.SimpleNamespace(
+                hashes=hashes, ec=ec, x25519=x25519, AESGCM=AESGCM, HKDF=HKDF,
+                Encoding=Encoding, PublicFormat=PublicFormat, load_der_public_key=load_der_public_key,
+                InvalidTag=InvalidTag,
+            )
+        return cls._crypto
+
+    @classmethod
+    def _load_server_pub(cls, server_pub_key):
+        # 32바이트 raw는 X25519, 0x30으로 시작하면 DER SubjectPublicKeyInfo, 그 외에는 SEC1 P-256 포인트로 해석
+        server_pub = cls._server_pub_cache.get(server_pub_key)
+        if server_pub is None:
+            crypto = cls._get_crypto()
+            s_pub_raw = base64.b64decode(server_pub_key)
+            if len(s_pub_raw) == 32:
+                server_pub = crypto.x25519.X25519PublicKey.from_public_bytes(s_pub_raw)
+            elif s_pub_raw[:1] == b'\x30':
+                server_pub = crypto.load_der_public_key(s_pub_raw)
+            else:
+                server_pub = crypto.ec.EllipticCurvePublicKey.from_encoded_point(crypto.ec.SECP256R1(), s_pub_raw)
+
+            # 곡선 선택은 로드된 키 타입 기준 (DER은 X25519/P-256 모두 가능)
+            is_x25519 = isinstance(server_pub, crypto.x25519.X25519PublicKey)
+            is_p256 = (isinstance(server_pub, crypto.ec.EllipticCurvePublicKey)
+                       and isinstance(server_pub.curve, crypto.ec.SECP256R1))
+            if not (is_x25519 or is_p256):
+                raise ValueError("지원하지 않는 서버 공개키 형식입니다 (X25519 또는 P-256만 지원)")
+            cls._server_pub_cache[server_pub_key] = server_pub
+        return server_pub
+
+    @classmethod
+    def _handshake(cls, server_pub_key):
+        # 임시 키쌍을 생성하고 서버 공개키와 교환하여 (클라이언트 공개키 b64, AES 키)를 반환
+        crypto = cls._get_crypto()
+        server_pub = cls._load_server_pub(server_pub_key)
+
+        if isinstance(server_pub, crypto.x25519.X25519PublicKey):
+            # X25519: 단일 Montgomery ladder 호출 후 HKDF-SHA256으로 32바이트 AES 키 유도
+            client_key = crypto.x25519.X25519PrivateKey.generate()
+            raw_pub = client_key.public_key().public_bytes(crypto.Encoding.Raw, crypto.PublicFormat.Raw)
+            shared_secret = client_key.exchange(server_pub)
+            shared_key = crypto.HKDF(
+                algorithm=crypto.hashes.SHA256(), length=32, salt=None, info=b'z-engineer-aes',
+            ).derive(shared_secret)
+        else:
+            # P-256: 클라이언트 공개키는 SEC1 비압축 포인트
+            client_key = crypto.ec.generate_private_key(crypto.ec.SECP256R1())
+            raw_pub = client_key.public_key().public_bytes(crypto.Encoding.X962, crypto.PublicFormat.UncompressedPoint)
+            # ECDH 결과는 공유 포인트의 x 좌표 (32바이트 big-endian)
+            shared_secret = client_key.exchange(crypto.ec.ECDH(), server_pub)
+            shared_key = hashlib.sha256(shared_secret).digest()
+
+        return base64.b64encode(raw_pub).decode('utf-8'), shared_key
+
+    @classmethod
+    def _get_key_session(cls, server_pub_key):
+        # 캐시된 세션이 없거나 만료된 경우에만 핸드셰이크 (동시 실행 시 한 번만 수행되도록 잠금)
+        with cls._key_lock:
+            now = time.time()
+            entry = cls._cached_keys.get(server_pub_key)
+            if entry is None or now - entry[-1] > cls._key_lifetime:
+                logger.debug("🔐 [Z-Engineer] 새로운 보안 핸드셰이크를 시작합니다...")
+                client_pub_b64, shared_key = cls._handshake(server_pub_key)
+                # 키 스케줄 확장은 세션당 한 번만 수행
+                # nonce = 세션별 랜덤 prefix(8) + 단조 증가 카운터(8): 키마다 카운터를 새로 시작
+                entry = (client_pub_b64, cls._get_crypto().AESGCM(shared_key), os.urandom(8), itertools.count(1), now)
+                cls._cached_keys[server_pub_key] = entry
+                logger.info("✅ [Z-Engineer] 보안 세션 확립 완료 (ID: %s...)", client_pub_b64[:12])
+            return entry
+
+    @classmethod
+    def _invalidate_key_session(cls, server_pub_key, entry):
+        # 다른 스레드가 이미 재협상한 세션은 유지하고, 실패한 세션만 제거
+        with cls._key_lock:
+            if cls._cached_keys.get(server_pub_key) is entry:
+                del cls._cached_keys[server_pub_key]
+
+    @classmethod
+    def _post(cls, url, **kwargs):
+        # 연결 실패와 일시적 상태 코드 모두 백오프 후 재시도
+        import httpx
+        session = _get_shared_session()
+        for attempt in range(cls._max_retries + 1):
+            try:
+                response = session.post(url, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if attempt == cls._max_retries:
+                    raise
+                time.sleep(min(cls._backoff_factor * (2 ** attempt), cls._backoff_max))
+                continue
+            if response.status_code not in cls._retry_status or attempt == cls._max_retries:
+                return response
+            time.sleep(cls._retry_delay(response, attempt))
+
+    @classmethod
+    def _retry_delay(cls, response, attempt):
+        # 서버가 Retry-After(초)를 주면 우선 적용, 어느 경우든 큐 슬롯 점유를 막기 위해 상한 적용
+        # RFC 9110 delay-seconds(음이 아닌 정수)만 인정하고, nan/inf/지수 표기/HTTP-date는 지수 백오프로 대체
+        retry_after = response.headers.get("Retry-After", "").strip()
+        if retry_after.isascii() and retry_after.isdigit():
+            return min(int(retry_after), cls._backoff_max)
+        return min(cls._backoff_factor * (2 ** attempt), cls._backoff_max)
+
+    @classmethod
+    def _cache_key(cls, api_url, server_pub_key, system_prompt, prompt, seed, max_tokens, temperature, **kwargs):
+        # 생성 결과에 영향을 주는 입력만으로 구성한 내용 기반 키
+        fields = [_normalize_url(api_url), _strip_input(server_pub_key), system_prompt, prompt, seed, max_tokens, temperature]
+        return hashlib.blake2b(_dumps(fields), digest_size=16).digest()
 
     def send_request(self, api_url, api_key, server_pub_key, system_prompt, prompt, seed, max_tokens, temperature, timeout):
-        # 1. 입력값 정제
-        api_url = api_url.strip().rstrip("/")
-        api_key = api_key.strip()
-        server_pub_key = server_pub_key.strip()
-        current_time = time.time()
-
-        # [중요] 서버 키 변경 감지 로직 - 클래스 변수를 직접 참조하여 리셋
-        if QwenSecureE2EEClient._current_server_pub_key != server_pub_key:
-            print(f"🔄 [Z-Engineer] 서버 공개키 변경 감지. 세션 메모리를 완전히 초기화합니다.")
-            QwenSecureE2EEClient._shared_key = None
-            QwenSecureE2EEClient._client_pub_b64 = None
-            QwenSecureE2EEClient._last_key_time = 0
-            QwenSecureE2EEClient._current_server_pub_key = server_pub_key
+        cache_key = QwenSecureE2EEClient._cache_key(api_url, server_pub_key, system_prompt, prompt, seed, max_tokens, temperature)
+
+        with QwenSecureE2EEClient._inflight_lock:
+            # 0. 동일 입력의 성공 결과가 캐시에 있으면 즉시 반환
+            cached = QwenSecureE2EEClient._result_cache.get(cache_key)
+            if cached is not None:
+                QwenSecureE2EEClient._result_cache.move_to_end(cache_key)
+                return cached
+
+            # 같은 요청이 이미 진행 중이면 그 결과를 기다림
+            future = QwenSecureE2EEClient._inflight.get(cache_key)
+            is_owner = future is None
+            if is_owner:
+                future = concurrent.futures.Future()
+                QwenSecureE2EEClient._inflight[cache_key] = future
+
+        if not is_owner:
+            try:
+                return future.result(timeout=timeout)
+            except concurrent.futures.TimeoutError:
+                logger.warning("❌ [Z-Engineer] 진행 중인 동일 요청 대기 시간 초과 (%ss)", timeout)
+                return (f"❌ 보안 통신 에러: 진행 중인 동일 요청 대기 시간 초과 ({timeout}s)",)
 
         try:
-            # 2. 세션 키가 없거나 만료된 경우 신규 핸드셰이크
-            if (QwenSecureE2EEClient._shared_key is None or 
-                current_time - QwenSecureE2EEClient._last_key_time > QwenSecureE2EEClient._key_lifetime):
-                
-                print("🔐 [Z-Engineer] 새로운 보안 핸드셰이크를 시작합니다...")
-                client_key = ECC.generate(curve='P-256')
-                
-                # 클라이언트 공개키 클래스 변수에 저장
-                raw_pub = client_key.public_key().export_key(format='raw')
-                QwenSecureE2EEClient._client_pub_b64 = base64.b64encode(raw_pub).decode('utf-8')
-                
-                # 서버 공개키 로드 및 공유 비밀 유도
-                s_pub_raw = base64.b64decode(server_pub_key)
-                server_pub = ECC.import_key(s_pub_raw, curve_name='P-256')
-                
-                shared_point = client_key.d * server_pub.pointQ
-                # 32바이트 AES 키 유도
-                QwenSecureE2EEClient._shared_key = SHA256.new(int(shared_point.x).to_bytes(32, 'big')).digest()
-                QwenSecureE2EEClient._last_key_time = current_time
-                print(f"✅ [Z-Engineer] 보안 세션 확립 완료 (ID: {QwenSecureE2EEClient._client_pub_b64[:12]}...)")
+            result = self._send_secure(api_url, api_key, server_pub_key, system_prompt, prompt, seed, max_tokens, temperature, timeout, cache_key)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with QwenSecureE2EEClient._inflight_lock:
+                QwenSecureE2EEClient._inflight.pop(cache_key, None)
 
-            # 전송에 사용할 최신 세션 정보 확정
-            target_key = QwenSecureE2EEClient._shared_key
-            target_client_id = QwenSecureE2EEClient._client_pub_b64
+    def _send_secure(self, api_url, api_key, server_pub_key, system_prompt, prompt, seed, max_tokens, temperature, timeout, cache_key):
+        # 1. 입력값 정제
+        api_url = _normalize_url(api_url)
+        api_key = _strip_input(api_key)
+        server_pub_key = _strip_input(server_pub_key)
+
+        if not _is_valid_url(api_url):
+            logger.warning("❌ [Z-Engineer] 잘못된 API URL: %r", api_url)
+            return (f"❌ 잘못된 API URL: {api_url!r} (http:// 또는 https:// 로 시작해야 합니다)",)
+
+        key_session = None
+        try:
+            # 2. 서버 공개키에 대한 세션 확보 (없거나 만료된 경우 신규 핸드셰이크)
+            key_session = QwenSecureE2EEClient._get_key_session(server_pub_key)
+            target_client_id, target_cipher, nonce_prefix, nonce_counter, _ = key_session
 
             # 3. 데이터 압축 및 암호화
-            payload_json = json.dumps({
+            payload_json = _dumps({
                 "system_prompt": system_prompt,
                 "prompt": prompt,
                 "seed": seed,
                 "max_tokens": max_tokens,
                 "temperature": temperature
             })
-            compressed_payload = zlib.compress(payload_json.encode('utf-8'), level=9)
+            compress_level = QwenSecureE2EEClient._compress_level if len(payload_json) >= QwenSecureE2EEClient._compress_threshold else 0
+            compressed_payload = zlib.compress(payload_json, level=compress_level)
             
-            cipher_enc = AES.new(target_key, AES.MODE_GCM)
-            ciphertext, tag = cipher_enc.encrypt_and_digest(compressed_payload)
+            # 서버 호환을 위해 16바이트 nonce 유지 (AESGCM 출력은 ciphertext + tag)
+            nonce = nonce_prefix + next(nonce_counter).to_bytes(8, 'big')
             
-            # nonce(16) + tag(16) + ciphertext 결합
-            combined_data = cipher_enc.nonce + tag + ciphertext
-            encrypted_payload = base64.b64encode(combined_data).decode('utf-8')
+            # 단일 스테이징 버퍼: [nonce(16) | tag 자리(16) | ciphertext | tag(16)]
+            # 암호문+태그를 32바이트 오프셋에 바로 기록한 뒤 태그만 앞쪽 슬롯으로 복사하고 마지막 16바이트는 전송에서 제외
+            combined_data = bytearray(len(compressed_payload) + 48)
+            staging = memoryview(combined_data)
+            staging[:16] = nonce
+            if hasattr(target_cipher, "encrypt_into"):
+                target_cipher.encrypt_into(nonce, compressed_payload, None, staging[32:])
+            else:
+                staging[32:] = target_cipher.encrypt(nonce, compressed_payload, None)
+            staging[16:32] = staging[-16:]
+            encrypted_payload = base64.b64encode(staging[:-16]).decode('ascii')
 
             # 4. 서버 전송
-            response = self._get_session().post(
-                f"{api_url}/engineer_secure",
-                json={"client_pub": target_client_id, "data": encrypted_payload},
-                headers={"X-API-Key": api_key},
+            endpoint, headers = _request_target(api_url, api_key)
+            response = self._post(
+                endpoint,
+                content=_dumps({"client_pub": target_client_id, "data": encrypted_payload}),
+                headers=headers,
                 timeout=timeout
             )
 
             if response.status_code == 200:
                 # 5. 응답 복호화 및 압축 해제
-                res_json = response.json()
+                res_json = _loads(response.content)
                 enc_res = base64.b64decode(res_json['result'])
                 
-                res_nonce, res_tag, res_ciphertext = enc_res[:16], enc_res[16:32], enc_res[32:]
-                cipher_dec = AES.new(target_key, AES.MODE_GCM, nonce=res_nonce)
-                
-                decrypted_compressed = cipher_dec.decrypt_and_verify(res_ciphertext, res_tag)
+                # nonce(16) + tag(16) + ciphertext -> AESGCM 입력 형식(ciphertext + tag)으로 재배치
+                res_view = memoryview(enc_res)
+                res_sealed = bytearray(len(enc_res) - 16)
+                res_sealed[:-16] = res_view[32:]
+                res_sealed[-16:] = res_view[16:32]
+                decrypted_compressed = target_cipher.decrypt(res_view[:16], res_sealed, None)
                 final_text = zlib.decompress(decrypted_compressed).decode('utf-8')
                 
-                return (final_text.strip(),)
+                result = (final_text.strip(),)
+                with QwenSecureE2EEClient._inflight_lock:
+                    QwenSecureE2EEClient._result_cache[cache_key] = result
+                    if len(QwenSecureE2EEClient._result_cache) > QwenSecureE2EEClient._result_cache_size:
+                        QwenSecureE2EEClient._result_cache.popitem(last=False)
+                return result
             
             else:
                 # 서버 에러 발생 시 세션 키 무효화 (동기화 오류 대비)
-                QwenSecureE2EEClient._shared_key = None
+                QwenSecureE2EEClient._invalidate_key_session(server_pub_key, key_session)
+                logger.warning("❌ [Z-Engineer] 서버 에러 (%s): %s", response.status_code, response.text[:100])
                 return (f"❌ 서버 에러 ({response.status_code}): {response.text[:100]}",)
 
         except Exception as e:
             # MAC 검증 실패 등 예외 발생 시 세션 초기화
-            QwenSecureE2EEClient._shared_key = None
-            return (f"❌ 보안 통신 에러: {str(e)}",)
+            if key_session is not None:
+                QwenSecureE2EEClient._invalidate_key_session(server_pub_key, key_session)
+            # InvalidTag 등 메시지가 비어 있는 예외도 원인이 드러나도록 설명 보강
+            crypto = QwenSecureE2EEClient._crypto
+            if crypto is not None and isinstance(e, crypto.InvalidTag):
+                detail = "응답 MAC 검증 실패 (세션 불일치)"
+            else:
+                detail = str(e) or type(e).__name__
+            logger.error("❌ [Z-Engineer] 보안 통신 에러: %s", detail)
+            return (f"❌ 보안 통신 에러: {detail}",)
 
     @classmethod
-    def IS_CHANGED(cls, **kwargs):
+    def IS_CHANGED(cls, api_url="", server_pub_key="", system_prompt="", prompt="", seed=0, max_tokens=0, temperature=0.0, **kwargs):
+        # 성공 결과가 캐시된 입력만 같은 토큰을 반환하여 ComfyUI가 이 노드와 하위 노드의 재실행을 생략할 수 있게 함
+        # 그 외(첫 실행, 서버 에러, 타임아웃 등)는 NaN으로 항상 재실행하여 에러 문자열이 재사용되지 않도록 함
+        cache_key = cls._cache_key(api_url, server_pub_key, system_prompt, prompt, seed, max_tokens, temperature)
+        if cache_key in cls._result_cache:
+            return cache_key.hex()
         return float("nan")
 
 NODE_CLASS_MAPPINGS = {"QwenSecureE2EEClient": QwenSecureE2EEClient}